@@ -1,39 +1,87 @@
-from monteCarlo import monte_carlo_tree_search, NUM_SIMULATIONS
+from monteCarlo import MonteCarloAgent, root_parallel_search, opponent, NUM_SIMULATIONS
+from opening_book import OpeningBook, BOOK_FILE
+from solver import Solver
 import random
-import pygame
 import time
 
-def move(game, algorithm):
-    # Process pygame events before starting move calculation
-    pygame.event.pump()
-    
+# Below this many empty cells, Monte Carlo moves come from the exact endgame solver
+SOLVER_THRESHOLD = 18
+endgame_solver = Solver()
+
+# One persistent Monte Carlo agent per side, so each keeps its search tree between moves
+agents = {}
+
+# Opening book, opened on first use (False when there is no book file)
+book = None
+
+def book_move(game):
+    global book
+    if book is None:
+        try:
+            book = OpeningBook(BOOK_FILE)
+        except FileNotFoundError:
+            book = False
+    return book.lookup(game) if book else None
+
+def move(game, algorithm, workers=1, progress=None, time_budget=None):
+    # progress(done, total) lets a GUI caller keep its window responsive;
+    # the algorithms themselves never touch pygame. time_budget (seconds) overrides
+    # the per-move share of the game clock; any display delay belongs to the GUI
     if algorithm == "Monte Carlo":
-        # Show that the algorithm is thinking
-        print("Monte Carlo algorithm is calculating...")
+        # Whatever answers the position, the background search is now stale
+        stop_pondering()
+        agent = agents.setdefault(game.current_player, MonteCarloAgent())
+        # Book and parallel moves never reach agent.move, so a new game is detected here
+        agent.observe(game)
         
-        # Start timer for timeout
-        start_time = time.time()
-        timeout = 5  # 5 seconds timeout
+        # Positions covered by the opening book are answered instantly
+        column = book_move(game)
+        if column is not None:
+            return column
         
-        # Process events periodically during calculation
-        while time.time() - start_time < 0.5:  # Small delay to show thinking
-            pygame.event.pump()
-            time.sleep(0.1)
+        # Late in the game an exact solve is cheaper than the search
+        if game.ROWS * game.COLUMNS - game.played_moves < SOLVER_THRESHOLD:
+            column, _ = endgame_solver.solve(game)
+            return column
         
-        best_move, _, _ = monte_carlo_tree_search(game, NUM_SIMULATIONS)
+        # Show that the algorithm is thinking
+        print("Monte Carlo algorithm is calculating...")
+        
+        if workers > 1:
+            # Root-parallel search on a warm process pool
+            if time_budget is None:
+                time_budget = agent.clock.budget(game)
+            start_time = time.time()
+            best_move, _, _ = root_parallel_search(game, NUM_SIMULATIONS, workers, progress=progress,
+                                                   max_time=time_budget)
+            agent.clock.spend(time.time() - start_time)
+        else:
+            best_move, _, _ = agent.move(game, progress=progress, time_budget=time_budget)
         return best_move
         
     elif algorithm == "Random":
         possible_moves = game.get_possible_moves()
-        
-        # Add a small delay for consistency
-        pygame.event.pump()
-        time.sleep(0.3)
-        
         return random.choice(possible_moves)
     else:
         raise ValueError("Unknown algorithm")
 
+def interrupt():
+    # Stop any running search; move() then returns the best move found so far.
+    # Root-parallel searches (workers > 1) run in other processes and always
+    # use their whole time budget, so this has no effect on them
+    for agent in agents.values():
+        agent.interrupt()
+
+def ponder(game, algorithm):
+    # Search on the opponent's time: the side not to move keeps thinking about
+    # the current position until its next call to move()
+    if algorithm == "Monte Carlo":
+        agents.setdefault(opponent(game.current_player), MonteCarloAgent()).ponder(game)
+
+def stop_pondering():
+    for agent in agents.values():
+        agent.stop_pondering()
+
 def random_move(game):
     possible_moves = game.get_possible_moves()
     return random.choice(possible_moves) if possible_moves else None
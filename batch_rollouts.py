@@ -0,0 +1,92 @@
+import numpy as np
+
+# Batched rollouts: many games advanced together as uint64 bitboard arrays.
+# The layout is the same as game.Game (ROWS + 1 bits per column), so a board
+# only fits while COLUMNS * (ROWS + 1) <= 64.
+
+
+def line_shifts(rows):
+    """Shifts for vertical, diagonal \\, horizontal and diagonal / lines"""
+    h1 = rows + 1
+    return [np.uint64(shift) for shift in (1, h1 - 1, h1, h1 + 1)]
+
+
+def has_four(bits, shifts):
+    """Element-wise check for four aligned pieces in an array of bitboards"""
+    found = np.zeros(bits.shape, dtype=bool)
+    for shift in shifts:
+        pairs = bits & (bits >> shift)
+        found |= (pairs & (pairs >> (shift + shift))) != 0
+    return found
+
+
+def initial_state(games, repeat=1):
+    """Stack the bitboards, heights and side to move of games, each one repeated"""
+    rows, columns = games[0].ROWS, games[0].COLUMNS
+    if columns * (rows + 1) > 64:
+        raise ValueError("Board too large for 64-bit batch rollouts")
+    bitboards = np.repeat(np.array([game.bitboards for game in games], dtype=np.uint64), repeat, axis=0)
+    heights = np.repeat(np.array([game.heights for game in games], dtype=np.int64), repeat, axis=0)
+    to_move = np.repeat(np.array([game.PLAYERS.index(game.current_player) for game in games]), repeat)
+    return bitboards, heights, to_move
+
+
+def rollout_batch(bitboards, heights, to_move, rows, rng=None, tactical=True):
+    """Play every game in the batch to the end, returning the winner index (0, 1, or -1 for a draw)"""
+    rng = rng if rng is not None else np.random.default_rng()
+    n, columns = heights.shape
+    h1 = rows + 1
+    shifts = line_shifts(rows)
+    bitboards = bitboards.copy()
+    heights = heights.copy()
+    to_move = to_move.copy()
+    index = np.arange(n)
+    column_base = np.arange(columns) * h1
+
+    winner = np.full(n, -1)
+    active = heights.sum(axis=1) < rows * columns
+    for player in (0, 1):
+        finished = has_four(bitboards[:, player], shifts)
+        winner[finished] = player
+        active &= ~finished
+
+    while active.any():
+        rows_left = index[active]
+        mover = to_move[rows_left]
+        legal = heights[rows_left] < rows
+        drops = np.left_shift(np.uint64(1), (column_base + np.minimum(heights[rows_left], rows)).astype(np.uint64))
+        drops = np.where(legal, drops, np.uint64(0))
+
+        # Random legal move, preferring an immediate win and then a block
+        score = np.where(legal, rng.random(legal.shape), -1.0)
+        own = bitboards[rows_left, mover][:, None] | drops
+        wins = legal & has_four(own, shifts)
+        if tactical:
+            theirs = bitboards[rows_left, 1 - mover][:, None] | drops
+            score += 2.0 * (legal & has_four(theirs, shifts)) + 4.0 * wins
+        move = score.argmax(axis=1)
+
+        bitboards[rows_left, mover] |= drops[np.arange(len(rows_left)), move]
+        heights[rows_left, move] += 1
+        to_move[rows_left] = 1 - mover
+
+        won = wins[np.arange(len(rows_left)), move]
+        winner[rows_left[won]] = mover[won]
+        full = heights[rows_left].sum(axis=1) == rows * columns
+        active[rows_left[won | full]] = False
+
+    return winner
+
+
+def simulate_batch(game, player, n, rng=None, tactical=True):
+    """Run n rollouts from game at once and return the result of each one for player"""
+    return simulate_leaves([game], [player], n, rng, tactical)[0]
+
+
+def simulate_leaves(games, players, n, rng=None, tactical=True):
+    """Run n rollouts from each game, returning an array of shape (len(games), n) of results for players"""
+    bitboards, heights, to_move = initial_state(games, n)
+    winner = rollout_batch(bitboards, heights, to_move, games[0].ROWS, rng, tactical)
+    winner = winner.reshape(len(games), n)
+    target = np.array([games[0].PLAYERS.index(player) for player in players])[:, None]
+    return np.where(winner == target, 1.0, np.where(winner == -1, 0.5, 0.0)).astype(np.float32)
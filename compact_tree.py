@@ -0,0 +1,119 @@
+import math
+import random
+from array import array
+from time import time
+
+from monteCarlo import C, MAX_TIME, NUM_SIMULATIONS, TacticalPolicy, opponent, simulate
+
+# Array-backed MCTS tree: nodes are integer indices into preallocated buffers
+# instead of Node objects. Children of a node are allocated contiguously, and
+# no node stores a game: the single root game is replayed along the selected
+# path with make_move and rewound with unmake_move after every iteration.
+
+
+class CompactTree:
+    def __init__(self, game, capacity=None, policy=None):
+        self.game = game.make_copy()
+        self.policy = policy or TacticalPolicy()
+        self.capacity = capacity or NUM_SIMULATIONS * game.COLUMNS + 1
+        self.parent = array("i", [-1]) * self.capacity
+        self.first_child = array("i", [-1]) * self.capacity
+        self.child_count = array("b", [0]) * self.capacity
+        self.move = array("b", [-1]) * self.capacity
+        self.visits = array("l", [0]) * self.capacity
+        self.wins = array("d", [0.0]) * self.capacity
+        self.size = 1
+
+    def expand(self, node):
+        """Allocate one child per legal move of the current game, if there is room"""
+        moves = self.game.get_possible_moves()
+        if self.size + len(moves) > self.capacity:
+            return False
+        first = self.size
+        for offset, move in enumerate(moves):
+            self.parent[first + offset] = node
+            self.move[first + offset] = move
+        self.first_child[node] = first
+        self.child_count[node] = len(moves)
+        self.size += len(moves)
+        return True
+
+    def select_child(self, node):
+        """UCB1 over the children of node, trying unvisited children first"""
+        first = self.first_child[node]
+        log_visits = math.log(self.visits[node])
+        best_score = -float("inf")
+        best_children = []
+        for child in range(first, first + self.child_count[node]):
+            visits = self.visits[child]
+            if visits == 0:
+                return child
+            score = self.wins[child] / visits + C * math.sqrt(log_visits / visits)
+            if score > best_score:
+                best_score = score
+                best_children = [child]
+            elif score == best_score:
+                best_children.append(child)
+        return random.choice(best_children)
+
+    def backpropagate(self, node, result):
+        """Iterative backpropagation, flipping the result at every level"""
+        while node != -1:
+            self.visits[node] += 1
+            self.wins[node] += result
+            result = 1 - result
+            node = self.parent[node]
+
+    def iterate(self):
+        """One selection, expansion, simulation and backpropagation pass"""
+        game = self.game
+        node = 0
+        depth = 0
+
+        while self.child_count[node] > 0 and not game.game_over():
+            node = self.select_child(node)
+            game.make_move(self.move[node])
+            depth += 1
+
+        if not game.game_over() and self.first_child[node] == -1 and self.expand(node):
+            node = self.first_child[node] + random.randrange(self.child_count[node])
+            game.make_move(self.move[node])
+            depth += 1
+
+        result = simulate(game, opponent(game.current_player), self.policy)
+        self.backpropagate(node, result)
+
+        for _ in range(depth):
+            game.unmake_move()
+
+    def run(self, num_simulations, progress=None, max_time=MAX_TIME):
+        """Run up to num_simulations iterations within the search time limit"""
+        start_time = time()
+        for i in range(num_simulations):
+            if i % 100 == 0:
+                if progress is not None:
+                    progress(i, num_simulations)
+                if max_time is not None and time() - start_time > max_time:
+                    break
+            self.iterate()
+
+    def best_move(self):
+        """Root move with the best win rate, with its score"""
+        best_score = -float("inf")
+        best_move = None
+        first = self.first_child[0]
+        for child in range(first, first + self.child_count[0]):
+            if self.visits[child] > 0:
+                score = self.wins[child] / self.visits[child]
+                if score > best_score:
+                    best_score = score
+                    best_move = self.move[child]
+        return best_move, best_score
+
+
+def compact_tree_search(game, num_simulations, progress=None, max_time=MAX_TIME, policy=None):
+    """Same contract as monteCarlo.monte_carlo_tree_search, on the array-backed tree"""
+    tree = CompactTree(game, num_simulations * game.COLUMNS + 1, policy)
+    tree.run(num_simulations, progress, max_time)
+    best_move, best_score = tree.best_move()
+    return best_move, best_score, tree.visits[0]
@@ -0,0 +1,119 @@
+import json
+import os
+
+import numpy as np
+
+# Columnar on-disk dataset: a directory holding one raw little-endian file per
+# field plus a small JSON header with the format version, the board size, the
+# schema (dtype and width of every field) and the number of committed rows.
+#
+# Rows are only ever appended: the field files are extended first and the
+# header is rewritten afterwards, so the header count is the commit point and
+# anything a crash leaves past it is cut off the next time the file is opened
+# for writing. Readers map every field with np.memmap, so opening a dataset of
+# millions of positions reads nothing but the header.
+
+MAGIC = "C4DS"
+VERSION = 1
+HEADER_FILE = "header.json"
+
+
+def schema(rows, columns):
+    """Fields of a dataset for a board size: name -> (dtype, values per row)"""
+    return {
+        "game": ("<u4", 1),
+        "ply": ("u1", 1),
+        "cells": ("i1", rows * columns),  # Row-major board: 0 empty, 1 for O and 2 for X
+        "player": ("u1", 1),  # Side to move, 1 for O and 2 for X
+        "move": ("u1", 1),  # Column chosen by MCTS
+        "visits": ("<f4", columns),  # Share of the root visits of every column
+        "outcome": ("<f4", 1),  # Final result for the side to move: 1, 0.5 or 0
+    }
+
+
+def read_header(path):
+    with open(os.path.join(path, HEADER_FILE)) as f:
+        header = json.load(f)
+    if header.get("magic") != MAGIC or header.get("version") != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} dataset")
+    return header
+
+
+class Dataset:
+    def __init__(self, path):
+        header = read_header(path)
+        self.path = path
+        self.rows, self.columns, self.count = header["rows"], header["columns"], header["count"]
+        self.fields = {name: (np.dtype(dtype), width) for name, (dtype, width) in header["fields"].items()}
+        self.arrays = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name):
+        """Zero-copy read-only view of a field, shape (count,) or (count, width)"""
+        if name not in self.arrays:
+            dtype, width = self.fields[name]
+            shape = (self.count,) if width == 1 else (self.count, width)
+            if self.count == 0:
+                self.arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                self.arrays[name] = np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=shape)
+        return self.arrays[name]
+
+    @property
+    def features(self):
+        """Board cells, one row per position (DecisionTree input)"""
+        return self["cells"]
+
+    @property
+    def labels(self):
+        """MCTS move of every position (DecisionTree target)"""
+        return self["move"]
+
+
+class DatasetWriter:
+    def __init__(self, path, rows, columns):
+        self.path = path
+        if os.path.exists(os.path.join(path, HEADER_FILE)):
+            header = read_header(path)
+            if (header["rows"], header["columns"]) != (rows, columns):
+                raise ValueError(f"{path} holds {header['rows']}x{header['columns']} boards")
+            self.count = header["count"]
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.count = 0
+        self.rows, self.columns = rows, columns
+        self.fields = {name: (np.dtype(dtype), width) for name, (dtype, width) in schema(rows, columns).items()}
+        # Drop rows written after the last committed header
+        for name, (dtype, width) in self.fields.items():
+            with open(os.path.join(path, name), "ab") as f:
+                f.truncate(self.count * dtype.itemsize * width)
+        self.write_header()
+
+    def write_header(self):
+        header = {"magic": MAGIC, "version": VERSION, "rows": self.rows, "columns": self.columns,
+                  "count": self.count,
+                  "fields": {name: (dtype.str, width) for name, (dtype, width) in self.fields.items()}}
+        temporary = os.path.join(self.path, HEADER_FILE + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(header, f)
+        os.replace(temporary, os.path.join(self.path, HEADER_FILE))
+
+    def append(self, data):
+        """Append a block of rows given as {field: array}, with every field present"""
+        count = len(data["game"])
+        for name, (dtype, width) in self.fields.items():
+            values = np.ascontiguousarray(data[name], dtype=dtype)
+            if values.shape != ((count,) if width == 1 else (count, width)):
+                raise ValueError(f"Field {name} has shape {values.shape} for {count} rows")
+            with open(os.path.join(self.path, name), "ab") as f:
+                values.tofile(f)
+        self.count += count
+        self.write_header()
+
+    def games(self):
+        """Indices of the games already in the dataset"""
+        if self.count == 0:
+            return set()
+        return set(np.unique(Dataset(self.path)["game"]).tolist())
@@ -0,0 +1,119 @@
+import os
+import random
+import sys
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from dataset_file import DatasetWriter
+from game import Game
+from monteCarlo import MAX_TIME, NUM_SIMULATIONS, Node, TranspositionTable, best_root_move, get_pool, search
+
+# Self-play dataset for the decision tree. Every ply of every game becomes one
+# row: the board as it was before the move, the side to move, the move chosen
+# by MCTS, the share of root visits each column received, and the final result
+# of the game for the side to move (1 win, 0.5 draw, 0 loss).
+#
+# Games are independent and seeded by their index, so they are spread over a
+# process pool and written as they finish. Rows are buffered and appended to
+# the dataset (see dataset_file) in chunks; an interrupted run is resumed by
+# skipping the games that are already in it.
+
+DATASET_FILE = "training_data"
+CHUNK_SIZE = 1000  # Rows buffered before they are appended to the file
+EXPLORE_PLIES = 8  # Opening plies played in proportion to the visits, for variety
+
+
+def encode(game):
+    """Board as a flat row-major vector: 0 empty, 1 for O and 2 for X"""
+    board = game.board
+    return ((board == "O") + 2 * (board == "X")).astype(np.int8).ravel()
+
+
+def self_play(index, seed, start=None, num_simulations=NUM_SIMULATIONS, max_time=MAX_TIME,
+              explore_plies=EXPLORE_PLIES):
+    """Play one MCTS self-play game and return its index with its rows as {field: array}"""
+    random.seed(seed)
+    game = start.make_copy() if start is not None else Game()
+    plies = []
+    while not game.game_over():
+        root = Node(game.make_copy(), table=TranspositionTable())
+        search(root, num_simulations, max_time=max_time)
+        visits = np.zeros(game.COLUMNS)
+        for child in root.children:
+            visits[child.game.last_move] = child.visits
+        visits /= visits.sum()
+        best_move, _ = best_root_move(root)
+        plies.append((encode(game), game.current_player, best_move, visits))
+
+        if game.played_moves < explore_plies:
+            game.make_move(random.choices(range(game.COLUMNS), weights=visits)[0])
+        else:
+            game.make_move(best_move)
+
+    cells, players, moves, visits = zip(*plies)
+    outcomes = [0.5 if game.winner == "Draw" else float(game.winner == player) for player in players]
+    return index, {
+        "game": np.full(len(plies), index),
+        "ply": np.arange(len(plies)),
+        "cells": np.array(cells),
+        "player": [game.PLAYERS.index(player) + 1 for player in players],
+        "move": moves,
+        "visits": np.array(visits),
+        "outcome": outcomes,
+    }
+
+
+def generate(path=DATASET_FILE, games=500, workers=None, num_simulations=NUM_SIMULATIONS // 10, max_time=MAX_TIME,
+             seed=0, start=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Play self-play games over a process pool and stream their rows to path.
+
+    Game i is seeded with seed + i, so running again with the same arguments
+    resumes where a previous run stopped. Returns the number of games in the file.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = start.make_copy() if start is not None else Game()
+    writer = DatasetWriter(path, start.ROWS, start.COLUMNS)
+    done = writer.games()
+    todo = [index for index in range(games) if index not in done]
+    buffer = []
+
+    def flush():
+        writer.append({name: np.concatenate([rows[name] for rows in buffer]) for name in buffer[0]})
+        buffer.clear()
+
+    def finished(index, rows):
+        done.add(index)
+        buffer.append(rows)
+        if sum(len(rows["game"]) for rows in buffer) >= chunk_size:
+            flush()
+        print(f"Self-play: game {len(done)}/{games}, {len(rows['game'])} positions")
+        if progress is not None:
+            progress(len(done), games)
+
+    try:
+        if workers == 1:
+            for index in todo:
+                finished(*self_play(index, seed + index, start, num_simulations, max_time))
+        else:
+            executor = get_pool(workers)
+            pending = {executor.submit(self_play, index, seed + index, start, num_simulations, max_time)
+                       for index in todo}
+            try:
+                while pending:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        finished(*future.result())
+            finally:
+                for future in pending:
+                    future.cancel()
+    finally:
+        # Whole games only, so whatever is written can be resumed from
+        if buffer:
+            flush()
+    return len(done)
+
+
+if __name__ == "__main__":
+    generate(games=int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+             workers=int(sys.argv[2]) if len(sys.argv) > 2 else None)
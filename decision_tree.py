@@ -1,50 +1,383 @@
+import os
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
 import numpy as np
-from collections import Counter
+from dataset_file import Dataset
+
+# Features whose histograms are built together by DecisionTree.information_gains
+FEATURE_BATCH = 4
+
+def share(array, directory, name):
+    # Workers map the training arrays from a file instead of receiving pickled
+    # copies: a memory-mapped array that covers its whole file is passed as it
+    # is, anything else is written once to a temporary file
+    if (isinstance(array, np.memmap) and array.filename is not None and array.flags.c_contiguous
+            and array.offset + array.nbytes == os.path.getsize(array.filename)):
+        return array.filename, array.dtype.str, array.shape, array.offset
+    path = os.path.join(directory, name)
+    np.ascontiguousarray(array).tofile(path)
+    return path, array.dtype.str, array.shape, 0
+
+def open_shared(shared):
+    filename, dtype, shape, offset = shared
+    return np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+def build_subtree(X_shared, y_shared, rows, features, depth, sorted_rows, n_classes, numeric, max_depth,
+                  min_samples_split):
+    # Runs in a worker process: builds one subtree serially and returns it,
+    # flattened (a deep tree would exceed pickle's recursion limit), with the
+    # class counts of its nodes, to be stitched into the parent tree
+    tree = DecisionTree(max_depth=max_depth, min_samples_split=min_samples_split)
+    tree.n_classes = n_classes
+    tree.node_counts = []
+    tree.numeric = numeric
+    X, y = open_shared(X_shared), open_shared(y_shared)
+    tree.branch = np.zeros(len(y), dtype=np.int64) if sorted_rows else None
+    return flatten(tree.build_tree(X, y, rows, features, depth, sorted_rows)), tree.node_counts
+
+def flatten(tree):
+    # Nested tree as a depth-first list of (split, keys) for nodes and
+    # (None, leaf) for leaves
+    entries, stack = [], [tree]
+    while stack:
+        tree = stack.pop()
+        if isinstance(tree, dict):
+            split, branches = next(iter(tree.items()))
+            entries.append((split, list(branches)))
+            stack.extend(reversed(list(branches.values())))
+        else:
+            entries.append((None, tree))
+    return entries
+
+def unflatten(entries):
+    holder = {}
+    stack = [(holder, None)]
+    for split, keys in entries:
+        parent, key = stack.pop()
+        if split is None:
+            parent[key] = keys
+            continue
+        branches = {}
+        parent[key] = {split: branches}
+        stack.extend((branches, child) for child in reversed(keys))
+    return holder[None]
 
 class DecisionTree:
-    def __init__(self):
+    def __init__(self, n_jobs=1, parallel_depth=1, numeric_features=None, max_depth=None, min_samples_split=2):
         self.tree = None
+        # Stopping rules: nodes at max_depth (None for no limit) or with fewer
+        # than min_samples_split samples become leaves
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        # Numeric features get binary threshold splits ({(feature, threshold):
+        # {"<=": subtree, ">": subtree}}) instead of one branch per value; by
+        # default every feature of a floating point X is numeric
+        self.numeric_features = numeric_features
+        self.numeric = None
+        self.branch = None
+        # With n_jobs > 1, the subtrees rooted parallel_depth levels below the
+        # root are built by a pool of n_jobs processes
+        self.n_jobs = n_jobs
+        self.parallel_depth = parallel_depth
+        self.executor = None
+        self.shared = None
+        # Class counts of the training samples of every node, in the order
+        # build_tree creates the nodes (depth-first, parent before children)
+        self.node_counts = None
+        self.n_classes = None
+        # Flat form of the tree built by compile: per node, the feature it
+        # splits on (-1 for a leaf), the threshold of numeric splits (NaN for
+        # the others), the child for every split value (-1 if none; children 0
+        # and 1 of a numeric split are the "<=" and ">" sides), the majority
+        # class and the class distribution of its training samples; values
+        # holds the sorted split values
+        self.feature = None
+        self.threshold = None
+        self.children = None
+        self.majority = None
+        self.distribution = None
+        self.values = None
 
     def entropy(self, y):
         counts = np.bincount(y)
-        probabilities = counts / len(y)
-        return -np.sum([p * np.log2(p) for p in probabilities if p > 0])
-
-    def information_gain(self, X, y, feature):
-        original_entropy = self.entropy(y)
-        values, counts = np.unique(X[:, feature], return_counts=True)
-        weighted_entropy = np.sum([(counts[i] / np.sum(counts)) * self.entropy(y[X[:, feature] == values[i]]) for i in range(len(values))])
-        return original_entropy - weighted_entropy
-
-    def best_feature(self, X, y):
-        information_gains = [self.information_gain(X, y, feature) for feature in range(X.shape[1])]
-        return np.argmax(information_gains)
-
-    def build_tree(self, X, y, features):
-        if len(np.unique(y)) == 1:
-            return y[0]
-        if len(features) == 0:
-            return Counter(y).most_common(1)[0][0]
-        best_feature = self.best_feature(X, y)
-        tree = {best_feature: {}}
-        features = [f for f in features if f != best_feature]
-        for value in np.unique(X[:, best_feature]):
-            subtree = self.build_tree(X[X[:, best_feature] == value], y[X[:, best_feature] == value], features)
-            tree[best_feature][value] = subtree
-        return tree
+        probabilities = counts[counts > 0] / len(y)
+        return -np.sum(probabilities * np.log2(probabilities))
+
+    def information_gains(self, X, y, features, rows=None):
+        # Class histogram of every (feature, value) pair from a bincount over
+        # combined feature/value/class indices, then all gains at once. rows
+        # restricts the computation to a subset of the samples. Features are
+        # gathered FEATURE_BATCH columns at a time, so the temporaries stay a
+        # small multiple of one column instead of the node's whole submatrix.
+        if rows is not None:
+            y = y[rows]
+        n_classes = int(y.max()) + 1
+        labels = y.astype(np.int32)[:, None]
+        weighted_entropy = []
+        for start in range(0, len(features), FEATURE_BATCH):
+            batch = features[start:start + FEATURE_BATCH]
+            values = np.stack([X[:, f] if rows is None else X[rows, f] for f in batch], axis=1)
+            values = self.value_codes(values)
+            n_values = int(values.max()) + 1
+            # int32 indices unless the histogram is too large for them
+            dtype = np.int32 if len(batch) * n_values * n_classes < 2 ** 31 else np.int64
+            index = values.astype(dtype)
+            index += np.arange(len(batch), dtype=dtype) * n_values
+            index *= n_classes
+            index += labels
+            counts = np.bincount(index.ravel(), minlength=len(batch) * n_values * n_classes)
+            counts = counts.reshape(len(batch), n_values, n_classes)
+            weighted_entropy.append((counts.sum(axis=2) * self.entropies(counts)).sum(axis=1) / len(y))
+        return self.entropy(y) - np.concatenate(weighted_entropy)
+
+    def value_codes(self, values):
+        # Number the distinct values of every column 0, 1, ..., so the histogram
+        # size follows the number of distinct values and not their range; small
+        # integer ranges only need an offset. Codes use the smallest unsigned
+        # dtype that holds them (uint8 for board cells).
+        if np.issubdtype(values.dtype, np.integer):
+            low, high = values.min(axis=0), values.max(axis=0)
+            span = int((high.astype(np.int64) - low.astype(np.int64)).max())
+            if span < len(values):
+                # Subtracting in the unsigned type of the same width is exact
+                # (modulo 2**bits) for any span the dtype can hold
+                unsigned = np.dtype(f"u{values.dtype.itemsize}")
+                return (values.view(unsigned) - low.view(unsigned)).astype(np.min_scalar_type(span))
+        order = np.argsort(values, axis=0, kind="stable")
+        ordered = np.take_along_axis(values, order, axis=0)
+        dtype = np.min_scalar_type(len(values))
+        ranks = np.zeros(values.shape, dtype=dtype)
+        np.cumsum(ordered[1:] != ordered[:-1], axis=0, dtype=dtype, out=ranks[1:])
+        codes = np.empty_like(ranks)
+        np.put_along_axis(codes, order, ranks, axis=0)
+        return codes
+
+    def entropies(self, counts):
+        # Entropy of every class histogram along the last axis (0 when empty)
+        totals = counts.sum(axis=-1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            probabilities = counts / totals
+            terms = np.where(counts > 0, probabilities * np.log2(probabilities), 0.0)
+        return -terms.sum(axis=-1)
 
-    def fit(self, X, y):
-        features = list(range(X.shape[1]))
-        self.tree = self.build_tree(X, y, features)
+    def threshold_split(self, values, y):
+        # Best binary cut of a numeric feature, given the node's values in
+        # ascending order: one sweep of cumulative class counts scores every
+        # cut between two distinct values. The threshold is the lower value of
+        # the cut, which "<=" separates exactly (a midpoint can round up to the
+        # upper value when the two are adjacent floats)
+        cuts = np.flatnonzero(values[1:] != values[:-1])
+        if len(cuts) == 0:
+            return -np.inf, None
+        left = np.cumsum(np.eye(self.n_classes, dtype=np.int64)[y], axis=0)[cuts]
+        right = np.bincount(y, minlength=self.n_classes) - left
+        sizes = cuts + 1
+        weighted_entropy = (sizes * self.entropies(left) + (len(y) - sizes) * self.entropies(right)) / len(y)
+        best = np.argmin(weighted_entropy)
+        return self.entropy(y) - weighted_entropy[best], values[cuts[best]]
 
-    def predict_one(self, x, tree):
-        if not isinstance(tree, dict):
-            return tree
-        feature = list(tree.keys())[0]
-        if x[feature] in tree[feature]:
-            return self.predict_one(x, tree[feature][x[feature]])
+    def best_split(self, X, y, rows, features, sorted_rows):
+        # Best categorical feature (threshold None) or numeric (feature,
+        # threshold) split; numeric cuts must have a positive gain
+        best_gain, best = -np.inf, None
+        if features:
+            available = [f for f in range(X.shape[1]) if features >> f & 1]
+            gains = self.information_gains(X, y, available, rows)
+            best_gain, best = gains.max(), (available[np.argmax(gains)], None)
+        for feature, ordered in (sorted_rows or {}).items():
+            gain, threshold = self.threshold_split(X[ordered, feature], y[ordered])
+            if threshold is not None and gain > max(best_gain, 1e-12):
+                best_gain, best = gain, (feature, threshold)
+        return best
+
+    def build_tree(self, X, y, rows, features, depth=0, sorted_rows=None):
+        # Built with an explicit stack rather than recursion: numeric features
+        # stay available at every depth, so a chain of threshold splits can be
+        # as deep as the data is long. Nodes are still created depth-first,
+        # parent before children, in the order node_counts expects.
+        holder = {}
+        stack = [(rows, features, depth, sorted_rows, holder, None)]
+        while stack:
+            rows, features, depth, sorted_rows, parent, key = stack.pop()
+            parent[key], children = self.build_node(X, y, rows, features, depth, sorted_rows)
+            if children:
+                branches = next(iter(parent[key].values()))
+                stack.extend(child + (branches, child_key) for child_key, child in reversed(children))
+        return holder[None]
+
+    def build_node(self, X, y, rows, features, depth, sorted_rows):
+        # One node: returns its subtree (a leaf, a Future or a dict with empty
+        # branches) and the (key, (rows, features, depth, sorted_rows)) of its
+        # children. rows holds the indices of the node's samples in the shared
+        # X and y, and is reordered in place so that every child gets a
+        # contiguous slice (a view) of it; features is a bitmask of the
+        # categorical features still available, and sorted_rows maps every
+        # numeric feature to the node's rows in ascending order of that feature
+        # (presorted once in fit)
+        counts = np.bincount(y[rows], minlength=self.n_classes)
+        self.node_counts.append(counts)
+        if (np.count_nonzero(counts) == 1 or (features == 0 and not sorted_rows)
+                or (self.max_depth is not None and depth >= self.max_depth)
+                or len(rows) < self.min_samples_split):
+            return counts.argmax(), []
+        if self.executor is not None and depth == self.parallel_depth:
+            # The subtree and its node counts are filled in by collect
+            future = self.executor.submit(build_subtree, *self.shared, rows.copy(), features, depth, sorted_rows,
+                                          self.n_classes, self.numeric, self.max_depth, self.min_samples_split)
+            self.node_counts[-1] = future
+            return future, []
+        split = self.best_split(X, y, rows, features, sorted_rows)
+        if split is None:
+            return counts.argmax(), []
+        best_feature, threshold = split
+        column = X[rows, best_feature]
+        if threshold is None:
+            order = np.argsort(column, kind="stable")
+            rows[:] = rows[order]
+            column = column[order]
+            starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+            keys = column[starts]
+            tree = {best_feature: {}}
+            features &= ~(1 << int(best_feature))
         else:
-            return Counter([self.predict_one(x, subtree) for subtree in tree[feature].values()]).most_common(1)[0][0]
+            left = column <= threshold
+            rows[:] = np.r_[rows[left], rows[~left]]
+            starts = np.array([0, np.count_nonzero(left)])
+            keys = ["<=", ">"]
+            tree = {(best_feature, threshold): {}}
+        ends = np.r_[starts[1:], len(rows)]
+        children = [rows[start:end] for start, end in zip(starts, ends)]
+        children_sorted = [None] * len(children)
+        if sorted_rows:
+            # Split every presorted list stably, so the children stay sorted
+            for child, child_rows in enumerate(children):
+                self.branch[child_rows] = child
+            children_sorted = [{} for _ in children]
+            for feature, ordered in sorted_rows.items():
+                branch = self.branch[ordered]
+                for child in range(len(children)):
+                    children_sorted[child][feature] = ordered[branch == child]
+        return tree, [(key, (child_rows, features, depth + 1, child_sorted))
+                      for key, child_rows, child_sorted in zip(keys, children, children_sorted)]
+
+    def collect(self, tree, depth=0):
+        # Replace the subtrees built by the pool with their results
+        if isinstance(tree, Future):
+            return unflatten(tree.result()[0])
+        if isinstance(tree, dict) and depth < self.parallel_depth:
+            for branches in tree.values():
+                for value, subtree in branches.items():
+                    branches[value] = self.collect(subtree, depth + 1)
+        return tree
+
+    def fit(self, X, y=None):
+        # X can also be a Dataset (or the path of one): its memory-mapped board
+        # cells and MCTS moves are used as they are, without loading the file
+        if isinstance(X, str):
+            X = Dataset(X)
+        if isinstance(X, Dataset):
+            X, y = X.features, X.labels
+        rows = np.arange(len(y))
+        self.numeric = np.zeros(X.shape[1], dtype=bool)
+        if self.numeric_features is None:
+            self.numeric[:] = np.issubdtype(X.dtype, np.floating)
+        else:
+            self.numeric[list(self.numeric_features)] = True
+        features = sum(1 << f for f in range(X.shape[1]) if not self.numeric[f])
+        # One O(n log n) sort per numeric feature; nodes only partition these lists
+        sorted_rows = {f: np.argsort(X[:, f], kind="stable") for f in np.flatnonzero(self.numeric)}
+        self.branch = np.zeros(len(y), dtype=np.int64) if sorted_rows else None
+        self.n_classes = int(y.max()) + 1
+        self.node_counts = []
+        if self.n_jobs > 1:
+            with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(self.n_jobs) as executor:
+                self.shared = (share(X, directory, "X"), share(y, directory, "y"))
+                self.executor = executor
+                try:
+                    self.tree = self.collect(self.build_tree(X, y, rows, features, sorted_rows=sorted_rows))
+                    self.node_counts = [counts for item in self.node_counts
+                                        for counts in (item.result()[1] if isinstance(item, Future) else [item])]
+                finally:
+                    self.executor = None
+                    self.shared = None
+        else:
+            self.tree = self.build_tree(X, y, rows, features, sorted_rows=sorted_rows)
+        self.compile()
+
+    def compile(self):
+        values = set()
+        subtrees = [self.tree]
+        for tree in subtrees:
+            if isinstance(tree, dict):
+                split, branches = next(iter(tree.items()))
+                if not isinstance(split, tuple):
+                    values.update(branches)
+                subtrees.extend(branches.values())
+        self.values = np.array(sorted(values))
+        self.feature = np.full(len(subtrees), -1, dtype=np.int64)
+        self.threshold = np.full(len(subtrees), np.nan)
+        self.children = np.full((len(subtrees), max(len(self.values), 2)), -1, dtype=np.int64)
+        counts = np.array(self.node_counts)
+        self.majority = counts.argmax(axis=1)
+        self.distribution = counts / counts.sum(axis=1, keepdims=True)
+        # Number the nodes in the same depth-first order as node_counts
+        stack = [(self.tree, -1, 0)]
+        node = 0
+        while stack:
+            tree, parent, code = stack.pop()
+            if parent >= 0:
+                self.children[parent, code] = node
+            if isinstance(tree, dict):
+                split, branches = next(iter(tree.items()))
+                if isinstance(split, tuple):
+                    self.feature[node], self.threshold[node] = split
+                    stack.append((branches[">"], node, 1))
+                    stack.append((branches["<="], node, 0))
+                else:
+                    self.feature[node] = split
+                    for value, subtree in reversed(branches.items()):
+                        stack.append((subtree, node, np.searchsorted(self.values, value)))
+            node += 1
+
+    def route(self, X):
+        # Every sample moves one level down per step, all at once, and stops at
+        # a leaf or at a node with no branch for its value (whose majority
+        # class then stands in for the unseen subtree)
+        X = np.asarray(X)
+        node = np.zeros(len(X), dtype=np.int64)
+        active = np.flatnonzero(self.feature[node] >= 0)
+        while len(active):
+            values = X[active, self.feature[node[active]]]
+            threshold = self.threshold[node[active]]
+            numeric = ~np.isnan(threshold)
+            codes = np.where(numeric, values > threshold, 0)
+            seen = numeric
+            if len(self.values):
+                categorical = np.minimum(np.searchsorted(self.values, values), len(self.values) - 1)
+                seen = numeric | (self.values[categorical] == values)
+                codes = np.where(numeric, codes, categorical)
+            child = np.where(seen, self.children[node[active], codes], -1)
+            active, child = active[child >= 0], child[child >= 0]
+            node[active] = child
+            active = active[self.feature[child] >= 0]
+        return node
+
+    def predict_one(self, x):
+        node = 0
+        while self.feature[node] >= 0:
+            value = x[self.feature[node]]
+            if not np.isnan(self.threshold[node]):
+                node = self.children[node, int(value > self.threshold[node])]
+                continue
+            code = np.searchsorted(self.values, value)
+            if code == len(self.values) or self.values[code] != value or self.children[node, code] < 0:
+                break
+            node = self.children[node, code]
+        return self.majority[node]
 
     def predict(self, X):
-        return np.array([self.predict_one(x, self.tree) for x in X])
\ No newline at end of file
+        return self.majority[self.route(X)]
+
+    def predict_proba(self, X):
+        # Class distribution of the training samples at the node each sample reaches
+        return self.distribution[self.route(X)]
\ No newline at end of file
@@ -1,8 +1,52 @@
 import numpy as np
-import pygame
 import copy
+import sys
 import time
-import algorithms
+from collections import namedtuple
+
+# PyGame is only imported by the GUI methods, so the game state can be used
+# headless (search workers, dataset generation) without initializing SDL
+
+# Every four-cell window of a board size, computed once and shared by scoring,
+# win detection and threat detection:
+#   bits    - bit indices of the four cells of each line
+#   masks   - the same cells as one bitmask per line
+#   through - for every bit index, the lines that contain it
+#   cells   - (lines, 4) array of flat row * COLUMNS + col indices into the board
+WinLines = namedtuple("WinLines", ["bits", "masks", "through", "cells"])
+_win_lines = {}
+
+# Score of a window by (pieces of O, pieces of X) in it, as in the original evaluation
+SEGMENT_SCORES = [[0, 1, 10, 50, 0],
+                  [-1, 0, 0, 0, 0],
+                  [-10, 0, 0, 0, 0],
+                  [-50, 0, 0, 0, 0],
+                  [0, 0, 0, 0, 0]]
+
+
+def win_lines(rows, columns):
+    """Winning-line tables for a board size"""
+    if (rows, columns) not in _win_lines:
+        h1 = rows + 1
+        bits, cells = [], []
+        for row in range(rows):
+            for col in range(columns):
+                # Horizontal, vertical, diagonal / and diagonal \ from (row, col)
+                for d_row, d_col in ((0, 1), (1, 0), (-1, 1), (1, 1)):
+                    end_row, end_col = row + 3 * d_row, col + 3 * d_col
+                    if 0 <= end_row < rows and end_col < columns:
+                        line = [(row + i * d_row, col + i * d_col) for i in range(4)]
+                        bits.append(tuple(c * h1 + (rows - 1 - r) for r, c in line))
+                        cells.append([r * columns + c for r, c in line])
+        masks = [sum(1 << bit for bit in line) for line in bits]
+        through = [[] for _ in range(h1 * columns)]
+        for index, line in enumerate(bits):
+            for bit in line:
+                through[bit].append(index)
+        _win_lines[rows, columns] = WinLines(bits, masks, [tuple(lines) for lines in through],
+                                             np.array(cells, dtype=np.int64))
+    return _win_lines[rows, columns]
+
 
 class Game:
     ROWS = 6
@@ -11,6 +55,7 @@ class Game:
     WIDTH = COLUMNS * CELL_SIZE
     HEIGHT = (ROWS + 1) * CELL_SIZE
     RADIUS = CELL_SIZE // 2 - 5
+    PLAYERS = ("O", "X")
 
     # Colors
     WHITE = (255, 255, 255)
@@ -22,8 +67,29 @@ class Game:
     DARK_RED = (94, 25, 20)
 
     def __init__(self, board=None, turn="O", score=0, played_moves=0,
-                 winnings_coords=None, last_move=None, algorithm1=None, algorithm2=None):
-        self.board = board if board is not None else np.full((self.ROWS, self.COLUMNS), "-")
+                 winnings_coords=None, last_move=None, algorithm1=None, algorithm2=None,
+                 rows=None, columns=None, incremental=True, track_score=False):
+        # Board size variants shadow the class defaults on the instance
+        if rows is not None or columns is not None:
+            self.ROWS = rows or self.ROWS
+            self.COLUMNS = columns or self.COLUMNS
+            self.WIDTH = self.COLUMNS * self.CELL_SIZE
+            self.HEIGHT = (self.ROWS + 1) * self.CELL_SIZE
+        # When incremental, make_move checks only the lines through the dropped
+        # piece and caches the result, so game_over never rescans the board
+        self.incremental = incremental
+        # Bitboard state: one mask per player (indexed like PLAYERS) plus the
+        # number of pieces in each column. Every column takes ROWS + 1 bits, the
+        # extra sentinel bit stops shifted lines from wrapping into the next column.
+        self.H1 = self.ROWS + 1
+        self.lines = win_lines(self.ROWS, self.COLUMNS)
+        # One bit at the bottom of every column, and every playable cell
+        self.bottom_mask = ((1 << self.H1 * self.COLUMNS) - 1) // ((1 << self.H1) - 1)
+        self.board_mask = self.bottom_mask * ((1 << self.ROWS) - 1)
+        self.bitboards = [0, 0]
+        self.heights = [0] * self.COLUMNS
+        # Columns played through make_move, so moves can be taken back in place
+        self.history = []
         self.winner = None
         self.current_player = turn  # Added current_player attribute
         self.score = score
@@ -36,6 +102,13 @@ class Game:
         self.shadow_column = None
         self.running = True
         self.width= self.WIDTH
+        # With track_score, per-line piece counts keep self.score up to date on
+        # every make_move/unmake_move, touching only the lines through the move
+        self.line_counts = None
+        if board is not None:
+            self.board = board
+        if track_score:
+            self.track_score()
 
         # PyGame specific attributes (initialized when needed)
         self.screen = None
@@ -45,152 +118,177 @@ class Game:
     def initialize_pygame(self):
         """Initialize PyGame components only when needed for GUI"""
         if not self.pygame_initialized:
+            import pygame
             pygame.init()
             self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
             self.font = pygame.font.SysFont("monospace", 50)
             self.pygame_initialized = True
 
+    @property
+    def board(self):
+        """Character view of the bitboards ("O", "X" or "-"), row 0 at the top"""
+        board = np.full((self.ROWS, self.COLUMNS), "-")
+        for index, player in enumerate(self.PLAYERS):
+            bits = self.bitboards[index]
+            while bits:
+                low = bits & -bits
+                row, col = self.cell(low.bit_length() - 1)
+                board[row][col] = player
+                bits ^= low
+        return board
+
+    @board.setter
+    def board(self, board):
+        """Load the bitboards from a character board"""
+        self.bitboards = [0, 0]
+        self.heights = [0] * self.COLUMNS
+        for row in range(self.ROWS):
+            for col in range(self.COLUMNS):
+                if board[row][col] in self.PLAYERS:
+                    index = self.PLAYERS.index(board[row][col])
+                    self.bitboards[index] |= 1 << self.bit(row, col)
+                    self.heights[col] += 1
+        self.played_moves = sum(self.heights)
+        self.winner = None
+        self.winnings_coords = None
+        self.game_over_flag = False
+        if self.incremental:
+            self.scan_board()
+        if self.line_counts is not None:
+            self.track_score()
+
+    @property
+    def turn(self):
+        """Alias of current_player used by the terminal and play_game front-ends"""
+        return self.current_player
+
+    def bit(self, row, col):
+        """Bit index of a board cell"""
+        return col * self.H1 + (self.ROWS - 1 - row)
+
+    def cell(self, bit):
+        """Board cell (row, col) of a bit index"""
+        col, height = divmod(bit, self.H1)
+        return self.ROWS - 1 - height, col
+
+    def key(self):
+        """Unique position key built from both bitboards (the side to move follows from them)"""
+        return self.bitboards[0] << (self.H1 * self.COLUMNS) | self.bitboards[1]
+
+    def four_in_a_row(self, bits):
+        """Find four aligned pieces in a bitboard, returning (first bit, step) or None"""
+        # Vertical, diagonal \, horizontal and diagonal /
+        for shift in (1, self.H1 - 1, self.H1, self.H1 + 1):
+            pairs = bits & (bits >> shift)
+            fours = pairs & (pairs >> 2 * shift)
+            if fours:
+                return (fours & -fours).bit_length() - 1, shift
+        return None
+
+    def line_through(self, bits, bit):
+        """Index of a complete line of a bitboard passing through one bit, or None"""
+        masks = self.lines.masks
+        for line in self.lines.through[bit]:
+            if bits & masks[line] == masks[line]:
+                return line
+        return None
+
+    def threats(self, player=None):
+        """Bitmask of empty cells that would complete a line for player (default: the one to move)"""
+        index = 0 if (player or self.current_player) == "O" else 1
+        own, other = self.bitboards[index], self.bitboards[1 - index]
+        empty = ~(own | other)
+        threats = 0
+        for mask in self.lines.masks:
+            if not other & mask and (own & mask).bit_count() == 3:
+                threats |= mask & empty
+        return threats
+
+    def playable(self):
+        """Bitmask of the cells where the next piece of each non-full column lands"""
+        return (self.bitboards[0] | self.bitboards[1]) + self.bottom_mask & self.board_mask
+
+    def column_of(self, bits):
+        """Column of the lowest set bit of a mask"""
+        return ((bits & -bits).bit_length() - 1) // self.H1
+
+    def set_winner(self, player, bits=None):
+        """Record the end of the game, with the bit indices of the winning line"""
+        self.winner = player
+        if bits is not None:
+            self.winnings_coords = [self.cell(bit) for bit in bits]
+        self.game_over_flag = True
+
+    def scan_board(self):
+        """Full-board win and draw check, used when no last move is known"""
+        for index, player in enumerate(self.PLAYERS):
+            line = self.four_in_a_row(self.bitboards[index])
+            if line is not None:
+                start, step = line
+                self.set_winner(player, [start + i * step for i in range(4)])
+                return
+        if self.played_moves == self.ROWS * self.COLUMNS:
+            self.set_winner("Draw")
+
     def clear_board_except_winning_pieces(self):
         """Clear the board except for winning pieces"""
         if self.winnings_coords:
-            for i in range(self.ROWS):
-                for j in range(self.COLUMNS):
-                    if (i, j) not in self.winnings_coords:
-                        if self.board[i][j] == "O":
-                            self.board[i][j] = "-"
-                        elif self.board[i][j] == "X":
-                            self.board[i][j] = "-"
+            keep = 0
+            for row, col in self.winnings_coords:
+                keep |= 1 << self.bit(row, col)
+            self.bitboards = [bits & keep for bits in self.bitboards]
+            if self.line_counts is not None:
+                self.track_score()
 
     def get_score(self):
         """Calculate the current board score"""
-        def evaluate_segment(segment):
-            if "O" in segment and "X" not in segment:
-                count = segment.count("O")
-                if count == 3: return -50
-                elif count == 2: return -10
-                elif count == 1: return -1
-            elif "X" in segment and "O" not in segment:
-                count = segment.count("X")
-                if count == 1: return 1
-                elif count == 2: return 10
-                elif count == 3: return 50
-            return 0
+        if self.line_counts is not None:
+            return self.score
 
+        o_bits, x_bits = self.bitboards
         self.score = 0
-        # Horizontal
-        for row in range(self.ROWS):
-            for col in range(self.COLUMNS - 3):
-                segment = [self.board[row][col + i] for i in range(4)]
-                self.score += evaluate_segment(segment)
-        # Vertical
-        for row in range(self.ROWS - 3):
-            for col in range(self.COLUMNS):
-                segment = [self.board[row + i][col] for i in range(4)]
-                self.score += evaluate_segment(segment)
-        # Diagonal /
-        for row in range(self.ROWS - 3):
-            for col in range(self.COLUMNS - 3):
-                segment = [self.board[row + i][col + i] for i in range(4)]
-                self.score += evaluate_segment(segment)
-        # Diagonal \
-        for row in range(3, self.ROWS):
-            for col in range(self.COLUMNS - 3):
-                segment = [self.board[row - i][col + i] for i in range(4)]
-                self.score += evaluate_segment(segment)
-
+        for mask in self.lines.masks:
+            self.score += SEGMENT_SCORES[(o_bits & mask).bit_count()][(x_bits & mask).bit_count()]
         return self.score
 
+    def track_score(self):
+        """Start keeping the score incrementally from per-line piece counts"""
+        self.line_counts = [[(bits & mask).bit_count() for mask in self.lines.masks]
+                            for bits in self.bitboards]
+        o_counts, x_counts = self.line_counts
+        self.score = sum(SEGMENT_SCORES[o][x] for o, x in zip(o_counts, x_counts))
+
+    def update_score(self, index, bit, change):
+        """Add change (+1 or -1) pieces of a player to the lines through a bit"""
+        o_counts, x_counts = self.line_counts
+        counts = self.line_counts[index]
+        for line in self.lines.through[bit]:
+            self.score -= SEGMENT_SCORES[o_counts[line]][x_counts[line]]
+            counts[line] += change
+            self.score += SEGMENT_SCORES[o_counts[line]][x_counts[line]]
+
     def full_column(self, column):
         """Check if a column is full"""
-        return self.board[0][column] != "-"
+        return self.heights[column] == self.ROWS
 
     def move(self, column):
         """Make a move in the specified column"""
-        if column < 0 or column >= self.COLUMNS or self.full_column(column):
-            return False
-
-        for row in reversed(range(self.ROWS)):
-            if self.board[row][column] == "-":
-                self.board[row][column] = self.current_player
-                self.played_moves += 1
-                self.last_move = column
-                self.current_player = "X" if self.current_player == "O" else "O"
-                return True
-        return False
+        return self.make_move(column)
 
     def get_shadow_row(self, column):
         """Get the row where a piece would land in a column"""
         if column < 0 or column >= self.COLUMNS or self.full_column(column):
             return None
-        for row in reversed(range(self.ROWS)):
-            if self.board[row][column] == "-":
-                return row
-        return None
+        return self.ROWS - 1 - self.heights[column]
 
     def game_over(self, clear_board=False):
         """Check if the game is over"""
-        if self.game_over_flag:
-            return True
-
-        # Check horizontal
-        for row in range(self.ROWS):
-            for col in range(self.COLUMNS - 3):
-                if (self.board[row][col] != "-" and
-                        self.board[row][col] == self.board[row][col+1] ==
-                        self.board[row][col+2] == self.board[row][col+3]):
-                    self.winner = self.board[row][col]
-                    self.winnings_coords = [(row, col+i) for i in range(4)]
-                    if clear_board:
-                        self.clear_board_except_winning_pieces()
-                    self.game_over_flag = True
-                    return True
-
-        # Check vertical
-        for row in range(self.ROWS - 3):
-            for col in range(self.COLUMNS):
-                if (self.board[row][col] != "-" and
-                        self.board[row][col] == self.board[row+1][col] ==
-                        self.board[row+2][col] == self.board[row+3][col]):
-                    self.winner = self.board[row][col]
-                    self.winnings_coords = [(row+i, col) for i in range(4)]
-                    if clear_board:
-                        self.clear_board_except_winning_pieces()
-                    self.game_over_flag = True
-                    return True
-
-        # Check diagonal /
-        for row in range(self.ROWS - 3):
-            for col in range(self.COLUMNS - 3):
-                if (self.board[row][col] != "-" and
-                        self.board[row][col] == self.board[row+1][col+1] ==
-                        self.board[row+2][col+2] == self.board[row+3][col+3]):
-                    self.winner = self.board[row][col]
-                    self.winnings_coords = [(row+i, col+i) for i in range(4)]
-                    if clear_board:
-                        self.clear_board_except_winning_pieces()
-                    self.game_over_flag = True
-                    return True
-
-        # Check diagonal \
-        for row in range(3, self.ROWS):
-            for col in range(self.COLUMNS - 3):
-                if (self.board[row][col] != "-" and
-                        self.board[row][col] == self.board[row-1][col+1] ==
-                        self.board[row-2][col+2] == self.board[row-3][col+3]):
-                    self.winner = self.board[row][col]
-                    self.winnings_coords = [(row-i, col+i) for i in range(4)]
-                    if clear_board:
-                        self.clear_board_except_winning_pieces()
-                    self.game_over_flag = True
-                    return True
-
-        # Check for draw
-        if self.played_moves == self.ROWS * self.COLUMNS:
-            self.winner = "Draw"
-            self.game_over_flag = True
-            return True
+        if not self.game_over_flag and not self.incremental:
+            self.scan_board()
 
-        return False
+        if self.game_over_flag and clear_board:
+            self.clear_board_except_winning_pieces()
+        return self.game_over_flag
 
 
     def draw_board(self):
@@ -198,7 +296,9 @@ class Game:
         if not self.pygame_initialized:
             return
 
+        import pygame
         self.screen.fill(self.BLUE)
+        board = self.board
 
         # Draw slots
         for row in range(self.ROWS):
@@ -209,12 +309,12 @@ class Game:
                                    self.RADIUS)
 
                 # Draw pieces
-                if self.board[row][col] == "O":
+                if board[row][col] == "O":
                     pygame.draw.circle(self.screen, self.YELLOW,
                                        (col * self.CELL_SIZE + self.CELL_SIZE // 2,
                                         (row + 1) * self.CELL_SIZE + self.CELL_SIZE // 2),
                                        self.RADIUS)
-                elif self.board[row][col] == "X":
+                elif board[row][col] == "X":
                     pygame.draw.circle(self.screen, self.RED,
                                        (col * self.CELL_SIZE + self.CELL_SIZE // 2,
                                         (row + 1) * self.CELL_SIZE + self.CELL_SIZE // 2),
@@ -244,6 +344,9 @@ class Game:
 
     def run_game(self):
         """Main game loop for PyGame interface"""
+        import pygame
+        import algorithms
+
         self.initialize_pygame()
         clock = pygame.time.Clock()
         ai_turn = False
@@ -270,7 +373,7 @@ class Game:
             if ai_turn and not self.game_over():
                 current_algorithm = self.algorithm1 if self.current_player == "O" else self.algorithm2
                 if current_algorithm:
-                    column = algorithms.move(self, current_algorithm)
+                    column = algorithms.move(self, current_algorithm, progress=self.handle_events)
                     if column is not None:
                         self.move(column)
                     time.sleep(0.5)  # Small delay for visualization
@@ -303,38 +406,92 @@ class Game:
 
         pygame.quit()
 
+    def handle_events(self, done=None, total=None):
+        """Search progress callback that keeps the PyGame window responsive"""
+        import pygame
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
     def get_possible_moves(self):
         """Get all valid moves"""
         return [col for col in range(self.COLUMNS) if not self.full_column(col)]
 
     def make_copy(self):
-        """Create a deep copy of the game state without pygame objects"""
+        """Create a copy of the game state without pygame objects"""
         new_game = Game(
-            board=copy.deepcopy(self.board),
             turn=self.current_player,  # Ensure current_player is copied
             score=self.score,
             played_moves=self.played_moves,
             winnings_coords=copy.deepcopy(self.winnings_coords) if self.winnings_coords else None,
             last_move=self.last_move,
             algorithm1=self.algorithm1,
-            algorithm2=self.algorithm2
+            algorithm2=self.algorithm2,
+            rows=self.ROWS,
+            columns=self.COLUMNS,
+            incremental=self.incremental
         )
+        new_game.bitboards = self.bitboards[:]
+        new_game.heights = self.heights[:]
+        new_game.history = self.history[:]
+        new_game.winner = self.winner
         new_game.game_over_flag = self.game_over_flag
+        if self.line_counts is not None:
+            new_game.line_counts = [counts[:] for counts in self.line_counts]
         return new_game
 
     def make_move(self, column):
         """Make a move (used by AI algorithms)"""
-        if column < 0 or column >= self.COLUMNS or self.full_column(column):
+        if column < 0 or column >= self.COLUMNS or self.full_column(column) or self.game_over_flag:
             return False
 
-        for row in reversed(range(self.ROWS)):
-            if self.board[row][column] == "-":
-                self.board[row][column] = self.current_player
-                self.played_moves += 1
-                self.last_move = column
-                self.current_player = "X" if self.current_player == "O" else "O"
-                return True
-        return False
+        index = 0 if self.current_player == "O" else 1
+        bit = column * self.H1 + self.heights[column]
+        self.bitboards[index] |= 1 << bit
+        self.heights[column] += 1
+        self.history.append(column)
+        self.played_moves += 1
+        self.last_move = column
+        self.current_player = "X" if self.current_player == "O" else "O"
+        if self.line_counts is not None:
+            self.update_score(index, bit, 1)
+
+        if self.incremental:
+            line = self.line_through(self.bitboards[index], bit)
+            if line is not None:
+                self.set_winner(self.PLAYERS[index], self.lines.bits[line])
+            elif self.played_moves == self.ROWS * self.COLUMNS:
+                self.set_winner("Draw")
+        return True
+
+    def unmake_move(self):
+        """Take back the last move played with make_move"""
+        if not self.history:
+            return False
+
+        column = self.history.pop()
+        self.current_player = "X" if self.current_player == "O" else "O"
+        index = 0 if self.current_player == "O" else 1
+        self.heights[column] -= 1
+        bit = column * self.H1 + self.heights[column]
+        self.bitboards[index] ^= 1 << bit
+        if self.line_counts is not None:
+            self.update_score(index, bit, -1)
+        self.played_moves -= 1
+        self.last_move = self.history[-1] if self.history else None
+        # Moves are refused once the game is over, so it was still open before this one
+        self.winner = None
+        self.winnings_coords = None
+        self.game_over_flag = False
+        return True
+
+    def is_winning_move(self, column, player=None):
+        """Check if dropping a piece of player (default: the one to move) in a column wins"""
+        player = player or self.current_player
+        index = 0 if player == "O" else 1
+        bit = column * self.H1 + self.heights[column]
+        return self.line_through(self.bitboards[index] | 1 << bit, bit) is not None
 
     def __copy__(self):
         """Copy support"""
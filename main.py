@@ -1,5 +1,4 @@
 from game import Game
-import pygame
 import algorithms
 import sys
 
@@ -104,11 +103,5 @@ def main():
                 col = algorithms.move(game, algorithm)
                 game.move(col)
 
-            # Ensure Pygame events are processed
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
 if __name__ == "__main__":
     main()
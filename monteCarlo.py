@@ -1,40 +1,123 @@
 import math
 import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from time import time
-import pickle
-import pygame
+import batch_rollouts
+from dataset_file import Dataset, DatasetWriter
+from game import SEGMENT_SCORES
 
 # Reduzido de 10000 para 1000 para melhor desempenho
 NUM_SIMULATIONS = 50000
 C = math.sqrt(1.41)  # Constante de exploração
 PRINT_ALL = False
 PRINT_BEST = True
+TABLE_SIZE = 200000  # Número máximo de posições na tabela de transposição
+MAX_TIME = 5  # 5 segundos máximo por pesquisa
+GAME_TIME = 120  # Relógio de cada jogador para a partida inteira (segundos)
+MIN_TIME = 0.05  # Tempo mínimo por jogada, mesmo com o relógio esgotado
+PONDER_SIMULATIONS = 10 * NUM_SIMULATIONS  # Limite de simulações enquanto o adversário pensa
+
+# Resultados provados (MCTS-Solver), do ponto de vista de quem jogou para chegar ao nó
+WIN, DRAW, LOSS = 1, 0.5, 0
+
+class Stats:
+    __slots__ = ("wins", "visits", "proven")
+
+    def __init__(self):
+        self.wins = 0
+        self.visits = 0
+        self.proven = None
+
+class TranspositionTable:
+    # Partilha as estatísticas entre nós da mesma posição (a árvore passa a ser um DAG).
+    # Quando está cheia substitui a entrada usada há mais tempo ("lru") ou, entre as
+    # `sample` mais antigas, a que tem menos visitas ("visits").
+    def __init__(self, max_size=TABLE_SIZE, policy="lru", sample=8):
+        if policy not in ("lru", "visits"):
+            raise ValueError("Unknown replacement policy")
+        self.max_size = max_size
+        self.policy = policy
+        self.sample = sample
+        self.entries = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key):
+        stats = self.entries.get(key)
+        if stats is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return stats
+        stats = Stats()
+        if self.max_size > 0:
+            if len(self.entries) >= self.max_size:
+                self.evict()
+            self.entries[key] = stats
+        return stats
+
+    def evict(self):
+        if self.policy == "lru":
+            self.entries.popitem(last=False)
+            return
+        oldest = []
+        for key, stats in self.entries.items():
+            oldest.append((stats.visits, key))
+            if len(oldest) == self.sample:
+                break
+        del self.entries[min(oldest)[1]]
 
 class Node:
-    def __init__(self, game, parent=None):
+    __slots__ = ("game", "parent", "children", "untried_moves", "table", "stats")
+
+    def __init__(self, game, parent=None, table=None):
         self.game = game
         self.parent = parent
         self.children = []
-        self.wins = 0
-        self.visits = 0
+        # Jogadas ainda sem filho: a expansão cria um filho de cada vez
+        self.untried_moves = [] if game.game_over() else game.get_possible_moves()
+        self.table = table
+        self.stats = table.lookup(game.key()) if table is not None else Stats()
+        if game.game_over():
+            # Um estado terminal está provado: só quem acabou de jogar pode ter ganho
+            self.stats.proven = DRAW if game.winner == "Draw" else WIN
+
+    @property
+    def wins(self):
+        return self.stats.wins
+
+    @property
+    def visits(self):
+        return self.stats.visits
+
+    @property
+    def proven(self):
+        return self.stats.proven
 
     def is_leaf(self):
-        return self.game.game_over() or len(self.children) == 0
+        return self.game.game_over() or not self.is_fully_expanded()
 
     def is_fully_expanded(self):
-        return len(self.children) == len(self.game.get_possible_moves())
+        return not self.untried_moves
 
     def expand(self):
-        possible_moves = self.game.get_possible_moves()
-        for move in possible_moves:
-            new_game = self.game.make_copy()
-            new_game.make_move(move)
-            self.children.append(Node(new_game, self))
+        move = self.untried_moves.pop(random.randrange(len(self.untried_moves)))
+        new_game = self.game.make_copy()
+        new_game.make_move(move)
+        child = Node(new_game, self, self.table)
+        self.children.append(child)
+        return child
 
     def select_child(self):
         best_score = -float("inf")
         best_children = []
         for child in self.children:
+            # Subárvores já provadas não precisam de mais simulações
+            if child.proven is not None:
+                continue
             if child.visits == 0:
                 return child
             # Fórmula UCB1
@@ -45,135 +128,435 @@ class Node:
                 best_children = [child]
             elif score == best_score:
                 best_children.append(child)
-        return random.choice(best_children)
+        return random.choice(best_children) if best_children else None
+
+    def prove(self):
+        # Os filhos estão do ponto de vista do jogador a jogar neste nó: basta
+        # um filho ganho para este nó estar perdido, e só com todos os filhos
+        # provados se sabe que está ganho (todos perdidos) ou empatado
+        if self.proven is not None:
+            return True
+        if any(child.proven == WIN for child in self.children):
+            self.stats.proven = LOSS
+        elif self.is_fully_expanded() and all(child.proven is not None for child in self.children):
+            self.stats.proven = DRAW if any(child.proven == DRAW for child in self.children) else WIN
+        return self.proven is not None
+
+    def propagate_proof(self):
+        # Sobe pela árvore enquanto os pais ficarem também provados
+        node = self.parent
+        while node is not None and node.prove():
+            node = node.parent
 
-    def backpropagate(self, result):
-        self.visits += 1
-        self.wins += result
+    def backpropagate(self, result, count=1):
+        # Os resultados são do ponto de vista de quem jogou para chegar a este nó;
+        # count é o número de simulações incluídas em result
+        self.stats.visits += count
+        self.stats.wins += result
         if self.parent is not None:
-            self.parent.backpropagate(result)
+            self.parent.backpropagate(count - result, count)
 
-def monte_carlo_tree_search(game, num_simulations):
-    root = Node(game)
-    
-    # Processar eventos pygame no início
-    pygame.event.pump()
-    
+def monte_carlo_tree_search(game, num_simulations, table=None, batch_size=1, progress=None, max_time=MAX_TIME,
+                            policy=None):
+    if table is None:
+        table = TranspositionTable()
+    # A raiz trabalha sobre uma cópia para não mexer no jogo que está a ser mostrado
+    root = Node(game.make_copy(), table=table)
+    search(root, num_simulations, batch_size=batch_size, progress=progress, max_time=max_time, policy=policy)
+    best_move, best_score = best_root_move(root)
+    return best_move, best_score, root.visits
+
+def search(root, num_simulations, batch_size=1, progress=None, max_time=MAX_TIME, stop=None, policy=None):
+    # progress(iteração, total) é chamado a cada 100 iterações; a interface
+    # gráfica usa-o para processar os seus eventos, a pesquisa não depende do pygame.
+    # max_time=None tira o limite de tempo e stop (threading.Event) interrompe a pesquisa.
+    # policy é a política de simulação (RandomPolicy, TacticalPolicy, ScoreGreedyPolicy)
+    policy = policy or TacticalPolicy()
     # Adicionar timestamp para timeout
     start_time = time()
-    max_time = 5  # 5 segundos máximo
     
     for i in range(num_simulations):
-        # Verificar timeout ou processar eventos a cada 100 iterações
+        # A primeira iteração corre sempre, para a raiz ter pelo menos um filho visitado
+        if i > 0 and stop is not None and stop.is_set():
+            break
+
+        # A raiz provada já tem resultado exato, não há mais nada a pesquisar
+        if root.prove():
+            break
+
+        # Verificar timeout ou reportar progresso a cada 100 iterações
         if i % 100 == 0:
-            # Processar eventos pygame para manter UI responsiva
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    import sys
-                    sys.exit()
+            if progress is not None:
+                progress(i, num_simulations)
             
             # Verificar se excedemos o limite de tempo
-            if time() - start_time > max_time:
+            elapsed = time() - start_time
+            if i > 0 and max_time is not None and elapsed > max_time:
+                break
+
+            # Parar mais cedo se a melhor jogada já não pode ser ultrapassada
+            remaining = num_simulations - i
+            if max_time is not None and i > 0 and elapsed > 0:
+                remaining = min(remaining, (max_time - elapsed) * i / elapsed)
+            if decided(root, remaining * batch_size):
                 break
                 
         node = root
         
         # Seleção
         while not node.is_leaf():
-            node = node.select_child()
+            child = node.select_child()
+            if child is None:
+                # Todos os filhos provados por outro caminho (transposição)
+                break
+            node = child
         
-        # Expansão
-        if not node.is_fully_expanded() and not node.game.game_over():
-            node.expand()
-            if node.children:
-                node = random.choice(node.children)
+        # Expansão (um só filho por iteração)
+        if not node.game.game_over() and not node.is_fully_expanded():
+            node = node.expand()
+
+        # Um estado terminal novo pode provar os seus antecessores
+        if node.proven is not None or node.prove():
+            node.propagate_proof()
         
-        # Simulação
-        result = simulate(node.game.make_copy(), node.game.current_player)
+        # Simulação (jogada e desfeita no próprio estado do nó), ou batch_size
+        # simulações de uma vez com o motor vetorizado
+        player = opponent(node.game.current_player)
+        if batch_size > 1:
+            result = float(batch_rollouts.simulate_batch(node.game, player, batch_size).sum())
+        else:
+            result = simulate(node.game, player, policy)
         
         # Retropropagação
-        node.backpropagate(result)
-    
+        node.backpropagate(result, batch_size)
+
+def decided(root, remaining_visits):
+    # A jogada mais visitada, que é também a de melhor pontuação, leva mais
+    # visitas de avanço do que as que ainda podem ser feitas
+    if not root.is_fully_expanded() or len(root.children) < 2:
+        return False
+    first, second = sorted(root.children, key=lambda child: child.visits, reverse=True)[:2]
+    if first.visits == 0 or best_root_move(root)[0] != first.game.last_move:
+        return False
+    return first.visits - second.visits > remaining_visits
+
+def best_root_move(root):
+    # Uma jogada provada ganha é sempre a escolhida; as provadas perdidas só
+    # se não houver alternativa
+    for child in root.children:
+        if child.proven == WIN:
+            return child.game.last_move, 1.0
+    counts = root_counts(root)
+    safe = {child.game.last_move: counts[child.game.last_move] for child in root.children
+            if child.proven != LOSS}
+    best_move, best_score = best_move_from_counts(safe or counts)
+    if best_move is None and not root.game.game_over():
+        # Sem visitas na raiz: qualquer jogada legal é melhor do que nenhuma
+        best_move = random.choice(root.game.get_possible_moves())
+    return best_move, best_score
+
+def root_counts(root):
+    # Vitórias e visitas de cada jogada da raiz
+    return {child.game.last_move: (child.wins, child.visits) for child in root.children}
+
+def best_move_from_counts(counts):
     # Encontrar melhor movimento
     best_score = -float("inf")
     best_move = None
     
-    for child in root.children:
-        if child.visits > 0:
-            score = child.wins / child.visits
+    for move, (wins, visits) in counts.items():
+        if visits > 0:
+            score = wins / visits
             if score > best_score:
                 best_score = score
-                best_move = child.game.last_move
+                best_move = move
     
-    return best_move, best_score, root.visits
+    return best_move, best_score
 
-def simulate(game, player):
-    max_iterations = 100
-    iteration = 0
-    opponent = "X" if player == "O" else "O"
+# Pool de processos mantido entre jogadas para não arrancar processos novos a cada pesquisa
+pool = None
+pool_workers = 0
 
-    while not game.game_over() and iteration < max_iterations:
-        possible_moves = game.get_possible_moves()
-        if not possible_moves:
-            break
+def get_pool(workers):
+    global pool, pool_workers
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.shutdown()
+        pool = ProcessPoolExecutor(max_workers=workers)
+        pool_workers = workers
+    return pool
 
-        # 1. Tenta ganhar imediatamente
-        for move in possible_moves:
-            temp_game = game.make_copy()
-            temp_game.make_move(move)
-            if temp_game.winner == player:
-                game.make_move(move)
-                break
-        else:
-            # 2. Tenta bloquear vitória do adversário
-            for move in possible_moves:
-                temp_game = game.make_copy()
-                temp_game.make_move(move)
-                if temp_game.winner == opponent:
-                    game.make_move(move)
-                    break
-            else:
-                # 3. Caso contrário, joga aleatoriamente
-                move = random.choice(possible_moves)
-                game.make_move(move)
-        iteration += 1
+def root_search_worker(game, num_simulations, seed, max_time=MAX_TIME, policy=None):
+    random.seed(seed)
+    root = Node(game, table=TranspositionTable())
+    search(root, num_simulations, max_time=max_time, policy=policy)
+    return root_counts(root)
+
+def root_parallel_search(game, num_simulations, workers, seed=None, progress=None, max_time=MAX_TIME,
+                         policy=None):
+    # Pesquisas independentes em paralelo (cada uma com a sua semente e orçamento),
+    # juntando no fim as vitórias e visitas de cada jogada da raiz. Os processos
+    # correm sempre até ao fim do orçamento: interrupt() não os pode parar
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    executor = get_pool(workers)
+    futures = [executor.submit(root_search_worker, game.make_copy(), num_simulations, seed + i, max_time, policy)
+               for i in range(workers)]
+    pending = set(futures)
+    while pending:
+        _, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+        if progress is not None:
+            progress(workers - len(pending), workers)
+
+    counts = {}
+    for future in futures:
+        for move, (wins, visits) in future.result().items():
+            total_wins, total_visits = counts.get(move, (0, 0))
+            counts[move] = (total_wins + wins, total_visits + visits)
+
+    best_move, best_score = best_move_from_counts(counts)
+    return best_move, best_score, sum(visits for _, visits in counts.values())
+
+class TimeManager:
+    # Reparte o relógio da partida pelas jogadas que faltam, dando mais tempo ao
+    # meio-jogo do que à abertura e ao fim, sem passar de move_time por jogada
+    def __init__(self, game_time=GAME_TIME, move_time=MAX_TIME):
+        self.game_time = game_time
+        self.move_time = move_time
+        self.remaining = game_time
+
+    def reset(self):
+        self.remaining = self.game_time
+
+    def budget(self, game):
+        cells = game.ROWS * game.COLUMNS
+        moves_left = max(1, (cells - game.played_moves + 1) // 2)
+        phase = game.played_moves / cells
+        weight = 1.5 if 0.15 <= phase <= 0.6 else 0.75
+        return max(MIN_TIME, min(self.move_time, weight * self.remaining / moves_left))
+
+    def spend(self, seconds):
+        self.remaining = max(0.0, self.remaining - seconds)
+
+class MonteCarloAgent:
+    # Guarda a árvore entre jogadas: depois da nossa jogada e da resposta do
+    # adversário a pesquisa continua a partir do neto correspondente
+    def __init__(self, num_simulations=NUM_SIMULATIONS, table_size=TABLE_SIZE, batch_size=1,
+                 game_time=GAME_TIME, move_time=MAX_TIME, policy=None):
+        self.num_simulations = num_simulations
+        self.batch_size = batch_size
+        self.policy = policy or TacticalPolicy()
+        self.table = TranspositionTable(table_size)
+        self.clock = TimeManager(game_time, move_time)
+        self.root = None
+        self.history = None  # Jogadas da última posição vista, para reconhecer uma partida nova
+        self.move_stop = threading.Event()
+        self.ponder_thread = None
+        self.ponder_stop = threading.Event()
+
+    def reuse(self, game):
+        # Procura a posição atual na raiz guardada, nos filhos e nos netos
+        if self.root is None:
+            return None
+        key = game.key()
+        level = [self.root]
+        for _ in range(3):
+            for node in level:
+                if node.game.key() == key:
+                    return node
+            level = [child for node in level for child in node.children]
+        return None
+
+    def new_game(self):
+        # Relógio cheio e árvore vazia
+        self.clock.reset()
+        self.root = None
+        self.history = None
+
+    def observe(self, game):
+        # Uma posição que não continua a última vista é de uma partida nova
+        if self.history is None or game.history[:len(self.history)] != self.history:
+            self.new_game()
+        self.history = game.history[:]
+
+    def set_root(self, game):
+        root = self.reuse(game)
+        if root is None:
+            root = Node(game.make_copy(), table=self.table)
+        root.parent = None  # Larga o resto da árvore antiga
+        self.root = root
+        return root
+
+    def move(self, game, progress=None, time_budget=None):
+        # Pesquisa anytime: dura o orçamento dado (ou o atribuído pelo relógio da
+        # partida) e interrupt() termina-a já com a melhor jogada encontrada
+        self.stop_pondering()
+        self.observe(game)
+        root = self.set_root(game)
+        if time_budget is None:
+            time_budget = self.clock.budget(game)
+        self.move_stop.clear()
+        start_time = time()
+        search(root, self.num_simulations, batch_size=self.batch_size, progress=progress,
+               max_time=time_budget, stop=self.move_stop, policy=self.policy)
+        self.clock.spend(time() - start_time)
+        best_move, best_score = best_root_move(root)
+        return best_move, best_score, root.visits
+
+    def interrupt(self):
+        self.move_stop.set()
+
+    def best_move(self):
+        # Melhor jogada até agora (pode ser chamada durante a pesquisa)
+        if self.root is None:
+            return None, -float("inf")
+        return best_root_move(self.root)
+
+    def ponder(self, game):
+        # Pesquisa a posição atual numa thread enquanto o adversário pensa; a jogada
+        # seguinte continua a partir do filho que corresponde à resposta dele
+        self.stop_pondering()
+        self.observe(game)
+        root = self.set_root(game)
+        self.ponder_stop.clear()
+        self.ponder_thread = threading.Thread(
+            target=search, args=(root, PONDER_SIMULATIONS),
+            kwargs={"batch_size": self.batch_size, "max_time": None, "stop": self.ponder_stop,
+                    "policy": self.policy},
+            daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        if self.ponder_thread is not None:
+            self.ponder_stop.set()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+
+def opponent(player):
+    return "X" if player == "O" else "O"
+
+class RandomPolicy:
+    # Política de simulação: start() no início de cada simulação, choose() escolhe
+    # a jogada e played() é chamado depois de cada jogada feita
+    def start(self, game):
+        pass
+
+    def choose(self, game):
+        return self.free_move(game)
+
+    def played(self, game, column):
+        pass
+
+    def free_move(self, game):
+        # Jogada aleatória legal (sem criar a lista de jogadas)
+        move = random.randrange(game.COLUMNS)
+        while game.full_column(move):
+            move = random.randrange(game.COLUMNS)
+        return move
+
+class TacticalPolicy(RandomPolicy):
+    # Mantém um mapa de ameaças por jogador (casas vazias que completam quatro):
+    # ganhar já e bloquear já são apenas um AND com as casas jogáveis
+    def start(self, game):
+        self.threats = [game.threats(player) for player in game.PLAYERS]
+
+    def choose(self, game):
+        playable = game.playable()
+        index = 0 if game.current_player == "O" else 1
+        # 1. Tenta ganhar imediatamente, 2. tenta bloquear vitória do adversário
+        for cells in (self.threats[index] & playable, self.threats[1 - index] & playable):
+            if cells:
+                return game.column_of(cells)
+        # 3. Caso contrário, joga segundo a política livre
+        return self.free_move(game)
+
+    def played(self, game, column):
+        # Só as linhas que passam pela casa jogada mudam
+        index = 1 if game.current_player == "O" else 0
+        bit = column * game.H1 + game.heights[column] - 1
+        own, other = game.bitboards[index], game.bitboards[1 - index]
+        self.threats[0] &= ~(1 << bit)
+        self.threats[1] &= ~(1 << bit)
+        masks = game.lines.masks
+        for line in game.lines.through[bit]:
+            mask = masks[line]
+            if not other & mask and (own & mask).bit_count() == 3:
+                self.threats[index] |= mask & ~own
+
+class ScoreGreedyPolicy(TacticalPolicy):
+    # Como a tática, mas fora das jogadas forçadas escolhe a que mais melhora a
+    # avaliação das linhas (get_score), com uma fração epsilon de jogadas aleatórias
+    def __init__(self, epsilon=0.1):
+        self.epsilon = epsilon
+
+    def free_move(self, game):
+        if random.random() < self.epsilon:
+            return super().free_move(game)
+        index = 0 if game.current_player == "O" else 1
+        o_bits, x_bits = game.bitboards
+        masks = game.lines.masks
+        best_gain = -float("inf")
+        best_moves = []
+        for move in range(game.COLUMNS):
+            if game.full_column(move):
+                continue
+            gain = 0
+            for line in game.lines.through[move * game.H1 + game.heights[move]]:
+                o_count, x_count = (o_bits & masks[line]).bit_count(), (x_bits & masks[line]).bit_count()
+                before = SEGMENT_SCORES[o_count][x_count]
+                after = SEGMENT_SCORES[o_count + 1][x_count] if index == 0 else SEGMENT_SCORES[o_count][x_count + 1]
+                gain += after - before
+            gain = -gain if index == 0 else gain  # O procura pontuações negativas
+            if gain > best_gain:
+                best_gain = gain
+                best_moves = [move]
+            elif gain == best_gain:
+                best_moves.append(move)
+        return random.choice(best_moves)
+
+POLICIES = {"random": RandomPolicy, "tactical": TacticalPolicy, "score": ScoreGreedyPolicy}
+
+def simulate(game, player, policy=None):
+    # Joga a partida no próprio estado e desfaz tudo no fim, sem cópias por jogada
+    policy = policy or TacticalPolicy()
+    max_iterations = 100
+    played = 0
+
+    policy.start(game)
+    while not game.game_over() and played < max_iterations:
+        move = policy.choose(game)
+        game.make_move(move)
+        policy.played(game, move)
+        played += 1
 
     if game.winner == player:
-        return 1
+        result = 1
     elif game.winner == "Draw":
-        return 0
+        result = 0.5
     else:
-        return 0
+        result = 0
 
-def train(game, iterations, save_file="training_data.pkl"):
-    data = load_training_data(save_file) or {}
-    print("Loaded training data.")
-    
-    for i in range(iterations):
-        print(f"Training iteration {i+1}/{iterations}")
-        
-        # Processar eventos pygame durante o treino
-        if i % 10 == 0:
-            pygame.event.pump()
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    import sys
-                    sys.exit()
-        
-        monte_carlo_tree_search(game, NUM_SIMULATIONS // 10)  # Simulações reduzidas para treino
-    
-    save_training_data(data, save_file)
-    print("Training data saved.")
+    # Desfaz a partida simulada
+    for _ in range(played):
+        game.unmake_move()
+    return result
+
+def train(game, iterations, save_file="training_data", progress=None, workers=None):
+    # Gera o conjunto de dados de treino por self-play a partir de game (uma
+    # partida por iteração), retomando o ficheiro se já existir
+    import datasets
+    print("Generating training data...")
+    games = datasets.generate(save_file, iterations, workers, NUM_SIMULATIONS // 10, start=game, progress=progress)
+    print(f"Training data saved: {games} games in {save_file}.")
+    return games
 
-def save_training_data(data, filename="training_data.pkl"):
-    with open(filename, "wb") as f:
-        pickle.dump(data, f)
+def save_training_data(data, filename="training_data", rows=6, columns=7):
+    # Acrescenta um bloco de linhas {campo: array} ao conjunto de dados em disco
+    DatasetWriter(filename, rows, columns).append(data)
 
-def load_training_data(filename="training_data.pkl"):
+def load_training_data(filename="training_data"):
+    # Conjunto de dados mapeado em memória (np.memmap), sem ler o ficheiro todo
     try:
-        with open(filename, "rb") as f:
-            return pickle.load(f)
+        return Dataset(filename)
     except FileNotFoundError:
         return None
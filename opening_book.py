@@ -0,0 +1,104 @@
+import random
+import struct
+import sys
+
+import numpy as np
+
+from game import Game
+from monteCarlo import MonteCarloAgent, NUM_SIMULATIONS
+
+# Opening book file: a small header followed by fixed-size records sorted by
+# position key, read through np.memmap so a lookup is a binary search over the
+# mapped file (no unpickling, and every process shares the same pages).
+# Positions are stored in canonical form (the smaller key of the position and
+# its mirror image), so each symmetric pair takes a single record.
+
+BOOK_FILE = "opening_book.bin"
+MAGIC = b"C4BK"
+VERSION = 1
+HEADER = struct.Struct("<4sHBBI")  # magic, version, rows, columns, record count
+RECORD = np.dtype([("key", "<u8"), ("move", "i1"), ("score", "<f4")])
+
+
+def position_key(game, mirror=False):
+    """64-bit key of the side to move's pieces plus the occupancy mask, optionally mirrored"""
+    index = 0 if game.current_player == "O" else 1
+    own, mask = game.bitboards[index], game.bitboards[0] | game.bitboards[1]
+    if mirror:
+        column_bits = (1 << game.H1) - 1
+        mirrored_own = mirrored_mask = 0
+        for col in range(game.COLUMNS):
+            shift, target = col * game.H1, (game.COLUMNS - 1 - col) * game.H1
+            mirrored_own |= (own >> shift & column_bits) << target
+            mirrored_mask |= (mask >> shift & column_bits) << target
+        own, mask = mirrored_own, mirrored_mask
+    return own + mask + game.bottom_mask
+
+
+def canonical_key(game):
+    """Book key of a position and whether it is the mirrored one"""
+    key, mirrored = position_key(game), position_key(game, mirror=True)
+    return (mirrored, True) if mirrored < key else (key, False)
+
+
+class OpeningBook:
+    def __init__(self, path=BOOK_FILE):
+        with open(path, "rb") as f:
+            magic, version, self.rows, self.columns, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        self.records = np.memmap(path, dtype=RECORD, mode="r", offset=HEADER.size, shape=(count,))
+
+    def __len__(self):
+        return len(self.records)
+
+    def lookup(self, game):
+        """Book move for the position, or None when it is not covered"""
+        if (game.ROWS, game.COLUMNS) != (self.rows, self.columns) or not len(self.records):
+            return None
+        key, mirrored = canonical_key(game)
+        keys = self.records["key"]
+        i = np.searchsorted(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return None
+        move = int(self.records["move"][i])
+        return game.COLUMNS - 1 - move if mirrored else move
+
+
+def write_book(entries, path=BOOK_FILE, rows=Game.ROWS, columns=Game.COLUMNS):
+    """Write {canonical key: (move, score)} entries as a sorted book file"""
+    records = np.zeros(len(entries), dtype=RECORD)
+    for i, (key, (move, score)) in enumerate(sorted(entries.items())):
+        records[i] = (key, move, score)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rows, columns, len(records)))
+        records.tofile(f)
+
+
+def build_book(path=BOOK_FILE, games=200, depth=8, num_simulations=NUM_SIMULATIONS, move_time=30,
+               explore=0.3, seed=None):
+    """Build a book from MCTS self-play: every position up to depth plies gets a deep search"""
+    rng = random.Random(seed)
+    entries = {}
+    for game_number in range(games):
+        game = Game()
+        agent = MonteCarloAgent(num_simulations, move_time=move_time)
+        while game.played_moves < depth and not game.game_over():
+            key, mirrored = canonical_key(game)
+            if key not in entries:
+                move, score, _ = agent.move(game, time_budget=move_time)
+                entries[key] = (game.COLUMNS - 1 - move if mirrored else move, score)
+            move = entries[key][0]
+            move = game.COLUMNS - 1 - move if mirrored else move
+            # Wander off the main line now and then so the book covers replies too
+            if rng.random() < explore:
+                move = rng.choice(game.get_possible_moves())
+            game.make_move(move)
+        print(f"Opening book: game {game_number + 1}/{games}, {len(entries)} positions")
+    write_book(entries, path)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    build_book(games=int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+               depth=int(sys.argv[2]) if len(sys.argv) > 2 else 8)
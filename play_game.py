@@ -7,9 +7,9 @@ import contextlib
 import threading
 import sys
 
-with contextlib.redirect_stdout(None):
-    import pygame
-    import pygame.gfxdraw
+# pygame is imported by load_pygame() only when a graphical mode starts,
+# so the terminal mode never initializes SDL
+pygame = None
 
 COLUMN_COUNT = 7
 ROW_COUNT = 6
@@ -25,6 +25,15 @@ DARK_YELLOW = (148, 105, 13)
 RED = (255, 36, 0)
 DARK_RED = (94, 25, 20)
 
+# Let the computer keep searching while the human player chooses a move
+PONDER = True
+
+def load_pygame():
+    global pygame
+    with contextlib.redirect_stdout(None):
+        import pygame
+        import pygame.gfxdraw
+
 def draw_message(screen, message):
     font = pygame.font.SysFont("monospace", 50)
     label = font.render(message, 1, BLACK)
@@ -48,17 +57,15 @@ def draw_board(game, screen):
     
     screen.fill(BLUE)
     
+    # The board is built from the bitboards on every access, so read it once
+    board = game.board
     for c in range(COLUMN_COUNT):
         for r in reversed(range(ROW_COUNT)):
             draw(WHITE)
-            if game.board[r][c] == "O":
+            if board[r][c] == "O":
                 draw(YELLOW)
-            elif game.board[r][c] == "X":
+            elif board[r][c] == "X":
                 draw(RED)
-            elif game.board[r][c] == "o":
-                draw(DARK_YELLOW)
-            elif game.board[r][c] == "x":
-                draw(DARK_RED)
     
     if game.turn == "O":
         draw_message(screen, "Yellow Turn")
@@ -97,10 +104,9 @@ def play_on_terminal(game):
         operators.refresh()
         print(game)
         
-        # Process pygame events to keep window responsive
-        pygame.event.pump()
-        
         if game.game_over(True):
+            # The human's last move may have ended the game while pondering
+            algorithms.stop_pondering()
             if game.winner == "X":
                 print("Red wins!")
             elif game.winner == "O":
@@ -111,6 +117,8 @@ def play_on_terminal(game):
         elif game.turn == "O":
             print("Yellow's turn")
             if game.algorithm1 is None:
+                if PONDER and game.algorithm2 is not None:
+                    algorithms.ponder(game, game.algorithm2)
                 column = input_column()
             else:
                 # Show thinking indicator
@@ -121,7 +129,6 @@ def play_on_terminal(game):
                         print(f"\rThinking {chars[i % 4]}", end='')
                         i += 1
                         sleep(0.2)
-                        pygame.event.pump()  # Keep UI responsive
                     print("\rMove complete!     ")
                 
                 move_done = threading.Event()
@@ -140,9 +147,8 @@ def play_on_terminal(game):
                 progress_thread.start()
                 ai_thread.start()
                 
-                # Process events while waiting
+                # Wait for the AI thread
                 while not move_done.is_set():
-                    pygame.event.pump()
                     sleep(0.1)
                 
                 ai_thread.join()
@@ -171,7 +177,6 @@ def play_on_terminal(game):
                             print(f"\rThinking {chars[i % 4]}", end='')
                             i += 1
                             sleep(0.2)
-                            pygame.event.pump()
                         print("\rMove complete!     ")
                     
                     column = None
@@ -184,7 +189,6 @@ def play_on_terminal(game):
                     ai_thread.start()
                     
                     while not move_done.is_set():
-                        pygame.event.pump()
                         sleep(0.1)
                     
                     ai_thread.join()
@@ -205,7 +209,6 @@ def play_on_terminal(game):
                         print(f"\rThinking {chars[i % 4]}", end='')
                         i += 1
                         sleep(0.2)
-                        pygame.event.pump()
                     print("\rMove complete!     ")
                 
                 column = None
@@ -218,7 +221,6 @@ def play_on_terminal(game):
                 ai_thread.start()
                 
                 while not move_done.is_set():
-                    pygame.event.pump()
                     sleep(0.1)
                 
                 ai_thread.join()
@@ -230,6 +232,7 @@ def play_on_terminal(game):
         print()
 
 def player_vs_player(game):
+    load_pygame()
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption('Connect 4 - player vs player')
@@ -258,12 +261,14 @@ def player_vs_player(game):
         pygame.display.update()
 
 def player_vs_algorithm(game):
+    load_pygame()
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption('Connect 4 - player vs ' + str(game.algorithm1))
     
     piece_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
     thinking_font = pygame.font.SysFont("monospace", 30)
+    pondering = False
     
     while True:
         draw_board(game, screen)
@@ -281,9 +286,19 @@ def player_vs_algorithm(game):
                 
                 if game.move(column):
                     draw_board(game, screen)
+                    # No reply is coming if the player's move ended the game
+                    if pondering and game.game_over():
+                        algorithms.stop_pondering()
+                        pondering = False
+        
+        # Search in the background while the player thinks
+        if PONDER and not pondering and not game.game_over() and game.algorithm1 and game.turn == "O":
+            algorithms.ponder(game, game.algorithm1)
+            pondering = True
         
         # Computer's turn with threading
         if not game.game_over() and game.algorithm1 and game.turn == "X":
+            pondering = False
             # Show thinking message
             thinking_label = thinking_font.render("Thinking...", 1, WHITE)
             thinking_rect = thinking_label.get_rect(center=(WIDTH // 2, 30))
@@ -324,6 +339,7 @@ def player_vs_algorithm(game):
         pygame.display.update()
 
 def algorithm_vs_algorithm(game):
+    load_pygame()
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption(f'Connect 4 - {game.algorithm1} vs {game.algorithm2}')
@@ -0,0 +1,98 @@
+# Exact Connect Four solver for the endgame: negamax with alpha-beta pruning,
+# centre-first move ordering and a transposition table of bounds.
+#
+# Scores follow the usual convention: 0 is a draw, a win scores the number of
+# the winner's own pieces still unplayed plus one (so faster wins score
+# higher), and a loss is the negated score of the opponent's win.
+
+TABLE_SIZE = 1000000
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class Solver:
+    def __init__(self, table_size=TABLE_SIZE):
+        self.table_size = table_size
+        self.table = {}
+        self.nodes = 0
+
+    def move_order(self, game):
+        """Columns from the centre outwards"""
+        centre = (game.COLUMNS - 1) / 2
+        return sorted(range(game.COLUMNS), key=lambda col: abs(col - centre))
+
+    def win_score(self, game):
+        """Score of winning with the next move of the side to move"""
+        return (game.ROWS * game.COLUMNS - game.played_moves + 1) // 2
+
+    def negamax(self, game, alpha, beta, order):
+        """Exact score of the position for the side to move, within the (alpha, beta) window"""
+        self.nodes += 1
+        if game.played_moves == game.ROWS * game.COLUMNS:
+            return 0
+
+        playable = game.playable()
+        if game.threats() & playable:
+            return self.win_score(game)
+
+        # The opponent cannot win on its next move here, so the best we can hope
+        # for is a win one move later
+        best_possible = (game.ROWS * game.COLUMNS - game.played_moves - 1) // 2
+        key = game.key()
+        entry = self.table.get(key)
+        if entry is not None:
+            value, flag = entry
+            if flag == EXACT:
+                return value
+            if flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                best_possible = min(best_possible, value)
+        if beta > best_possible:
+            beta = best_possible
+        if alpha >= beta:
+            return beta
+
+        original_alpha = alpha
+        best = -game.ROWS * game.COLUMNS
+        for col in order:
+            if game.full_column(col):
+                continue
+            game.make_move(col)
+            score = -self.negamax(game, -beta, -alpha, order)
+            game.unmake_move()
+            if score > best:
+                best = score
+            if score >= beta:
+                self.store(key, score, LOWER)
+                return score
+            if score > alpha:
+                alpha = score
+
+        self.store(key, best, UPPER if best <= original_alpha else EXACT)
+        return best
+
+    def store(self, key, value, flag):
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = (value, flag)
+
+    def solve(self, game):
+        """Best move and its exact score for the side to move"""
+        game = game.make_copy()
+        order = self.move_order(game)
+        for col in order:
+            if not game.full_column(col) and game.is_winning_move(col):
+                return col, self.win_score(game)
+
+        best_move, best_score = None, -game.ROWS * game.COLUMNS
+        alpha, beta = -game.ROWS * game.COLUMNS, game.ROWS * game.COLUMNS
+        for col in order:
+            if game.full_column(col):
+                continue
+            game.make_move(col)
+            score = -self.negamax(game, -beta, -alpha, order)
+            game.unmake_move()
+            if best_move is None or score > best_score:
+                best_move, best_score = col, score
+                alpha = max(alpha, score)
+        return best_move, best_score